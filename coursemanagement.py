@@ -11,7 +11,8 @@ CMPS200 course since it needs most of the covered materials
 to be able to create such complex program
 """
 import datetime
-import powerset
+import heapq
+import itertools
 import random
 import csv
 
@@ -194,6 +195,86 @@ class Course:
         return f'<Course: {self.name} - {self.section}, CRN: {str(self.crn)}>'
 
 
+class Offering:
+    """
+    An Offering is a lecture together with its linked section (if any)
+    that must be taken as one unit. Its time footprint on every day
+    is merged once so checking it against a semester plan doesn't need
+    to look at the links again
+    """
+
+    def __init__(self, lecture, link = None):
+        """creates an offering from a lecture and an optional linked section"""
+        self.lecture = lecture
+        self.link = link
+        self.courses = [lecture] if link is None else [lecture, link]
+        self.footprint = self.merge_footprint()
+
+    def merge_footprint(self):
+        """
+        returns a dictionary that maps each day abbreviation to the sorted
+        list of (starting time, ending time) periods of the offering's sections
+        """
+        footprint = {}
+        for course in self.courses:
+            for day in course.get_days_list():
+                footprint.setdefault(day.abbreviation, []).append((course.get_starting_time(), course.get_ending_time()))
+        for day in footprint:
+            footprint[day].sort(key = lambda x: x[1])
+        return footprint
+
+    # getters methods
+
+    def get_name(self):
+        return self.lecture.get_name()
+
+    def get_lecture(self):
+        return self.lecture
+
+    def get_link(self):
+        return self.link
+
+    def get_courses(self):
+        return self.courses
+
+    def get_footprint(self):
+        return self.footprint
+
+    def get_starting_times(self):
+        """
+        returns the starting times of the lecture then the link used to order offerings.
+        the datetime values are used since Time instances can't be tested for equality
+        """
+        return tuple(course.get_starting_time().time for course in self.courses)
+
+    def conflicted(self):
+        """checks if the sections of the offering overlap with each other"""
+        for day in self.footprint:
+            periods = self.footprint[day]
+            for i in range(1,len(periods)):
+                if periods[i][0] - periods[i - 1][1] <= 0:
+                    return True
+        return False
+
+    def fits(self, semester_plan):
+        """checks if the offering can be added to the semester plan without any overlap"""
+        for day in self.footprint:
+            for starts, ends in self.footprint[day]:
+                for course in semester_plan[day]:
+                    # same rule as CourseManager.overlap() applied in both orders
+                    if not (starts - course.get_ending_time() > 0 or course.get_starting_time() - ends > 0):
+                        return False
+        return True
+
+    def __str__(self):
+        """returns a string containing the sections of the offering"""
+        return ' + '.join([str(course) for course in self.courses])
+
+    def __repr__(self):
+        """returns a string representation of the offering"""
+        return f'<Offering: {self.get_name()}, CRNs: {"-".join([str(course.get_crn()) for course in self.courses])}>'
+
+
 class CourseNotFoundException(Exception):
     """
     Exception raised when a course or its CRN is
@@ -201,6 +282,14 @@ class CourseNotFoundException(Exception):
     """
     pass
 
+class NoOfferingException(ValueError):
+    """
+    Exception raised when a course exists but none of its lectures
+    can be taken, either because its links are broken or because
+    its linked sections overlap the lecture
+    """
+    pass
+
 class CourseManager:
     """
     The CourseManager class contains all the methods
@@ -213,6 +302,8 @@ class CourseManager:
         self.semester_name = semester_name
         self.available_courses = CourseManager.load_courses(courses_csv)
         self.courses_dict = self.build_courses_dict()
+        self.link_errors = self.check_links()
+        self.offerings = self.compile_offerings()
 
     @staticmethod
     def load_courses(csv_file):
@@ -253,6 +344,12 @@ class CourseManager:
     def get_courses_dict(self):
         return self.courses_dict
 
+    def get_link_errors(self):
+        return self.link_errors
+
+    def get_offerings(self):
+        return self.offerings
+
     def build_courses_dict(self):
         """
         creates a dictionary that maps CRN values to their Course instances.\n
@@ -264,6 +361,53 @@ class CourseManager:
             crn_courses[course.get_crn()] = course
         return crn_courses
 
+    def link_error(self, course, crn):
+        """returns a message if the link from a course to the given CRN is broken, None otherwise"""
+        link = self.crn_to_course(crn)
+        if link == -1:
+            return f'{course.get_name()} CRN {course.get_crn()} links to missing CRN {crn}'
+        elif link.get_name() != course.get_name():
+            return f'{course.get_name()} CRN {course.get_crn()} links to CRN {crn} of {link.get_name()}'
+        elif link.get_linked_crns() != [] and course.get_crn() not in link.get_linked_crns():
+            return f'{course.get_name()} CRN {course.get_crn()} links to CRN {crn} which does not link back'
+        return None
+
+    def check_links(self):
+        """
+        checks the referential integrity of the linked CRNs of every course
+        and returns a list of messages reporting the dangling links (missing CRN)
+        and the asymmetric ones (linked section of another course or not linking back)
+        """
+        errors = []
+        for course in self.available_courses:
+            for crn in course.get_linked_crns():
+                error = self.link_error(course, crn)
+                if error is not None:
+                    errors.append(error)
+        return errors
+
+    def compile_offerings(self):
+        """
+        creates a dictionary that maps each course name to the list of its valid offerings.
+        a lecture that doesn't require a link is an offering by itself, otherwise each
+        valid linked section that doesn't overlap with the lecture makes an offering with it.
+        this is done once when loading so the solvers never check links again
+        """
+        offerings = {}
+        for course in self.available_courses:
+            offerings.setdefault(course.get_name(), [])
+            if course.get_course_type() != 'lecture':
+                continue
+            if not course.has_required_link() or course.get_linked_crns() == []:
+                offerings[course.get_name()].append(Offering(course))
+            else:
+                for crn in course.get_linked_crns():
+                    if self.link_error(course, crn) is None:
+                        offering = Offering(course, self.crn_to_course(crn))
+                        if not offering.conflicted():
+                            offerings[course.get_name()].append(offering)
+        return offerings
+
 
     def overlap(self, course1, course2):
         """checks if the courses overlap where course1 must be before course2"""
@@ -419,19 +563,150 @@ class CourseManager:
         """
         This method uses the brute force technique to find the optimal solution which
         is finding the semester plan with the least time gap between each course and is valid.
-        This is done by selecting the courses sections that are required by the student and try
-        different combinations. Then we select only the valid semester plans.
+        This is done by trying every combination of the compiled offerings (lecture and
+        its linked section) of the courses required by the student, keeping only the
+        combinations without any time conflict.
         from these we calculate the sum of time gap for each day and return the semester plan with
         least time gaps possible.
-        The method returns a 2-tuple having the semester plan and its selected courses list
+        Among plans with the same time gaps, the one returned is the first of them in the
+        powerset order of the courses sections (the order the brute force used to try them).
+        The method returns a 2-tuple having the selected courses list and its semester plan
         """
-        possible_courses = self.select_courses(course_names)
-        possible_plans = [(course_combo, self.create_semester_plan(course_combo)) for course_combo in powerset.generatePowerSet(possible_courses)]
-        valid_plans = [plan for plan in possible_plans if self.valid_semester(plan[0],plan[1]) and self.contains_courses(plan[0],course_names)]
-        plans_breaks = [self.plan_total_breaks(plan[1]) for plan in valid_plans]
-        optimal_plan = valid_plans[plans_breaks.index(min(plans_breaks))] # this is our optimal semester_plan
+        names = self.canonical_names(course_names)
+        selections = [([], self.create_semester_plan([]))]
+        for name in names:
+            selections = self.extend_selections(selections, self.course_offerings(name))
+        possible_courses = self.select_courses(names)
+        plans_keys = []
+        for selected, plan in selections:
+            crns = [course.get_crn() for course in selected]
+            # powerset.generatePowerSet() counts in binary with the first course as the highest bit
+            membership = tuple([int(course.get_crn() in crns) for course in possible_courses])
+            plans_keys.append((self.plan_total_breaks(plan), membership))
+        optimal_plan = selections[plans_keys.index(min(plans_keys))] # this is our optimal semester_plan
         return optimal_plan
 
+    def canonical_names(self, course_names):
+        """
+        returns the catalog names of the given course names without repetitions
+        so the same course isn't taken twice (i.e. cmps211 and CMPS 211)
+        """
+        names = []
+        for name in course_names:
+            name = self.select_course(name)[0].get_name()
+            if name not in names:
+                names.append(name)
+        return names
+
+    def course_offerings(self, course_name):
+        """returns the compiled offerings of a course from its name"""
+        courses = self.select_course(course_name)
+        offerings = self.offerings[courses[0].get_name()]
+        if offerings == []:
+            raise NoOfferingException(f'{courses[0].get_name()} has no valid offering! ' + '; '.join(self.no_offering_reasons(courses)))
+        return offerings
+
+    def no_offering_reasons(self, courses):
+        """returns messages explaining why the lectures of the given course sections have no offering"""
+        reasons = []
+        for course in courses:
+            if course.get_course_type() != 'lecture':
+                continue
+            for crn in course.get_linked_crns():
+                error = self.link_error(course, crn)
+                if error is not None:
+                    reasons.append(error)
+                elif Offering(course, self.crn_to_course(crn)).conflicted():
+                    reasons.append(f'{course.get_name()} CRN {course.get_crn()} overlaps its linked CRN {crn}')
+        if reasons == []:
+            reasons.append('it has no lecture section')
+        return reasons
+
+    def extend_selections(self, selections, offerings):
+        """
+        returns the conflict free (selected courses, semester plan) pairs obtained
+        by adding one of the offerings given to each of the selections
+        """
+        new_selections = []
+        for offering in offerings:
+            for selected, plan in selections:
+                if offering.fits(plan):
+                    new_selected = selected + offering.get_courses()
+                    new_selections.append((new_selected, self.create_semester_plan(new_selected)))
+        return new_selections
+
+    def plan_days(self, semester_plan):
+        """returns the number of days having at least one course in the semester plan"""
+        return len([day for day in Day.week if semester_plan[day] != []])
+
+    def sweep(self, course_names, k, limit = None, unschedulable = None):
+        """
+        finds the optimal semester plan for every combination of k courses
+        from the pool of course names given (i.e. the electives of a major).
+        Instead of calling bf() for each combination, the feasible partial plans
+        of the current combination's first courses are kept on a stack and
+        extended one course at a time. Since the combinations are generated in
+        order, the next combinations sharing these first courses reuse them and
+        a partial is dropped as soon as no remaining combination starts with it.
+        When a partial has no feasible plan, the combinations starting with it
+        are skipped since adding courses can't make them feasible.
+        This is a generator that yields 3-tuples of the course names combination,
+        its optimal plan as a 2-tuple (selected courses, semester plan) like bf()
+        and a dictionary of metrics. The plan of each combination and the
+        combinations themselves are ranked by their total breaks then by the
+        number of days in university. Nothing is yielded before every combination
+        is searched, so limit can be given to only keep (and yield) the best ones.
+        Combinations having no valid semester plan are skipped. The courses of the
+        pool having no offering are left out and if a list is given as unschedulable,
+        the reason for each of them is appended to it
+        """
+        offerings = {} # the offerings of each course of the pool, resolved only once
+        for name in self.canonical_names(course_names):
+            try:
+                offerings[name] = self.course_offerings(name)
+            except NoOfferingException as error:
+                if unschedulable is not None:
+                    unschedulable.append(str(error))
+        names = list(offerings)
+
+        path = [] # course names of the partials on the stack (stack[i] selects path[:i])
+        stack = [[([], self.create_semester_plan([]))]]
+        ranked = [] # heap of the best combinations so far, the worst one on top
+        count = 0
+        for combo in itertools.combinations(names, k):
+            shared = 0
+            while shared < len(path) and path[shared] == combo[shared]:
+                shared += 1
+            del stack[shared + 1:] # the enumeration moved past these partials
+            selections = stack[-1]
+            for name in combo[shared:]:
+                if selections == []:
+                    break # no plan for the first courses so none for the whole combination
+                selections = self.extend_selections(selections, offerings[name])
+                if len(stack) < k: # the full combination is never reused so it isn't kept
+                    stack.append(selections)
+            path = list(combo[:len(stack) - 1])
+            if selections == []:
+                continue
+            plans_keys = [(self.plan_total_breaks(plan), self.plan_days(plan)) for _, plan in selections]
+            optimal_plan = selections[plans_keys.index(min(plans_keys))]
+            metrics = {
+            'breaks': min(plans_keys)[0],
+            'days': min(plans_keys)[1],
+            'sections': len(optimal_plan[0]),
+            'candidates': len(selections)
+            }
+            # keys are negated so the worst combination is popped first and the
+            # combination's index breaks ties so plans are never compared
+            entry = (-metrics['breaks'], -metrics['days'], -count, list(combo), optimal_plan, metrics)
+            count += 1
+            if limit is None or len(ranked) < limit:
+                heapq.heappush(ranked, entry)
+            elif ranked != [] and entry > ranked[0]:
+                heapq.heapreplace(ranked, entry)
+        for _, _, _, combo, optimal_plan, metrics in sorted(ranked, reverse = True):
+            yield combo, optimal_plan, metrics
+
 
     def greedy_time(self, course_names, semester_plan):
         """
@@ -452,63 +727,19 @@ class CourseManager:
             self.greedy_time(right,semester_plan)
 
     def inject_course(self, course_name, semester_plan):
-        """helper method for the time greedy algorithm."""
-        courses = self.select_course(course_name) # get that one course subject
-        lectures = [course for course in courses if course.get_course_type() == 'lecture'] # find all the lectures
-
-        earliest = None
-        course_works = False
-        if not lectures[0].has_required_link(): # check if the course requires a link
-            while not course_works:
-                earliest = min(lectures, key = lambda x: x.get_starting_time()) # find the earliest lecture available
-
-                # add the lecture to the current semester plan
-
-                new_semester = semester_plan[0] + [earliest]
-
-                new_plan = self.create_semester_plan(new_semester)
-
+        """
+        helper method for the time greedy algorithm.
+        it adds the earliest offering (lecture then its linked section)
+        that fits the current semester plan
+        """
+        offerings = sorted(self.course_offerings(course_name), key = lambda x: x.get_starting_times())
+        for offering in offerings:
+            if offering.fits(semester_plan[1]):
+                semester_plan[0] = semester_plan[0] + offering.get_courses()
                 semester_plan[1] = self.create_semester_plan(semester_plan[0])
-
-                # check if the semester_plan is still working
-                if self.valid_semester(new_semester,new_plan):
-                    course_works = True # the lecture selected works
-                    semester_plan[0] = new_semester
-                    semester_plan[1] = new_plan
-                    return
-                else:
-                    lectures.pop(lectures.index(earliest)) # we can't use it so we remove it from the suggestions
-        else: # the lecture requires linked courses then
-            while not course_works:
-                earliest = min(lectures, key = lambda x: x.get_starting_time()) # find the earliest lecture available
-                temp_link = self.crn_to_course(earliest.get_linked_crns()[0]) # use a temporary link to make course valid 
-                # add the lecture a new semester plan
-                new_semester = semester_plan[0] + [earliest,temp_link]
-                new_plan = self.create_semester_plan(new_semester)
-                # check if the semester_plan is still working
-                if self.valid_semester(new_semester,new_plan):
-                    course_works = True # the lecture selected works
-                    semester_plan[0] = semester_plan[0] + [earliest]
-                    semester_plan[1] = self.create_semester_plan(semester_plan[0])
-                else:
-                    lectures.pop(lectures.index(earliest)) # we can't use it so we remove it from the suggestions
-
-            # after we removed the temporary link, now find the early one using the same technique for finding the right lecture
-            link_found = False
-            early_link = None
-            links = self.crns_to_courses(earliest.get_linked_crns())
-            while not link_found:
-                early_link = min(links, key = lambda x: x.get_starting_time()) 
-                
-                new_semester = semester_plan[0] + [early_link]
-                new_plan = self.create_semester_plan(new_semester)
-
-                if self.valid_semester(new_semester,new_plan):
-                    link_found = True
-                    semester_plan[0] = new_semester
-                    semester_plan[1] = new_plan
-                else:
-                     links.pop(links.index(early_link))
+                return
+        # no offering works so let greedy() try another ordering of the courses
+        raise ValueError(f'no offering of {course_name} fits the semester plan')
 
     def greedy(self, course_names):
         """
@@ -516,21 +747,17 @@ class CourseManager:
         it doesn't give the optimal solution but a very convenient one or
         a very similar one.
 
-        for some reason this method doesn't work when 
-        the courses with linked section are at the end of
-        the list and I don't have the brain power to fix
-        it now so make sure to place these first before
-        courses who don't require any linked sections.
-        The problem I have observed isn't because it is linked
-        but because we always choose the earliest one we 
-        encounter a situation when the algorithm tries to
-        find an early time that is already taken by the other
-        courses. That would change the whole code or else it 
-        won't work.
-        A working solution is to shuffle the course_names list 
-        to obtain new ordering and hope it works
-        Even though it works it is not efficient
+        each course takes the earliest of its offerings that fits
+        the courses already selected. Since the first courses are
+        placed first they may take the times needed by a later course
+        and then none of its offerings fit. In that case the course_names
+        list is shuffled to obtain a new ordering and we try again.
+        Even though it works it is not efficient.
+        A course having no offering at all raises NoOfferingException
+        right away since no ordering would ever place it
         """
+        for name in course_names:
+            self.course_offerings(name)
         s = [[],self.create_semester_plan([])]
         try:
             self.greedy_time(course_names, s)